@@ -1,7 +1,11 @@
 import streamlit as st
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import csv
 import io
-from datetime import datetime, timedelta
+import re
+from functools import lru_cache
 
 # ---------------------------
 # Transformation Logic
@@ -63,186 +67,194 @@ spreadsheet_headers = [
     'Name', 'Group Attendance', 'Chart Note Written', 'Missing Info'
 ]
 
+# Export columns process_csv reads; everything else in the upload is skipped while parsing
+source_columns = [
+    'Date', 'Client Name', 'Unique ID', 'Group Attendance', "Client's Diagnosis Codes",
+    'Provider', 'Status', 'Appointment Type', 'Chart Note Written'
+]
+
+# Suffix stripped from a whitespace-normalized Appointment Type before abbreviating it:
+# everything from the first ' - ', otherwise a trailing duration such as '30 minutes'
+appointment_type_suffix = re.compile(r' - .*|(?:^| )\S+ \S*minutes$')
+
+# Missing Info checks in output order, and the text for every combination of them,
+# indexed by a bitmask with bit i set when missing_info_checks[i] failed
+missing_info_checks = ('Attendance', 'Status', 'Note', 'Diagnosis')
+missing_info_labels = [
+    ', '.join(label for bit, label in enumerate(missing_info_checks) if code & (1 << bit))
+    for code in range(1 << len(missing_info_checks))
+]
+
+# Output columns that process_csv computes itself rather than copying from the export
+computed_headers = frozenset({
+    'CMS1500', 'Appointment ID', 'Date Fixed', 'Week', 'Month', 'CPT Code', 'Missing Info'
+})
+
+# Source column for each output column, resolved once here instead of per row.
+# None marks the columns that are left blank for the billing spreadsheet.
+header_sources = {
+    sh: sh if sh in computed_headers else header_mapping.get(sh)
+    for sh in spreadsheet_headers
+}
+
+
+@lru_cache(maxsize=1024)
+def abbreviate(text):
+    """
+    Uppercase initials of each word, e.g. 'Jane Doe' -> 'JD'. Providers and
+    appointment types repeat heavily, so results are cached across uploads.
+    """
+    if not text:
+        return ''
+    words = text.strip().split()
+    abbreviation = ''.join(word[0].upper() for word in words)
+    return abbreviation
+
+
+def split_padded(field_value, num_clients):
+    """
+    Splits a comma-separated group field into exactly one stripped value per
+    client, padding with empty strings or dropping extras as needed.
+    """
+    if not field_value.strip():
+        return [''] * num_clients
+    values = [item.strip() for item in field_value.split(',')]
+    if len(values) < num_clients:
+        values.extend([''] * (num_clients - len(values)))
+    return values[:num_clients]
 
+
+@st.cache_data(show_spinner=False, max_entries=4)
 def process_csv(input_csv, remove_cols=None):
     """
     Processes the uploaded CSV data, transforming it according to the logic
-    in your original Python script. Returns the output CSV as a string.
+    in your original Python script. Returns the output CSV as UTF-8 bytes.
+    Results are cached on the input bytes, so Streamlit reruns with the same
+    upload don't redo the transformation.
     """
 
     if remove_cols is None:
         remove_cols = default_columns_to_remove
 
-    # Read CSV from the in-memory file object
-    reader = csv.DictReader(io.StringIO(input_csv.decode('utf-8')))
-    fieldnames = reader.fieldnames
-
-    # Determine columns to remove
-    columns_to_remove = [c for c in remove_cols if c in fieldnames]
-
-    # Prepare an in-memory buffer for writing the transformed CSV
-    output_buffer = io.StringIO()
-    writer = csv.DictWriter(output_buffer, fieldnames=spreadsheet_headers)
-    writer.writeheader()
-
-    for row in reader:
-        # If a column is in columns_to_remove, we can ignore it, but the main logic doesn't need them anyway.
-
-        # Split group appointments
-        client_names = [name.strip() for name in row['Client Name'].split(',')]
-        num_clients = len(client_names)
-
-        def get_field_values(field_name):
-            field_value = row.get(field_name, '')
-            if field_value.strip():
-                values = [item.strip() for item in field_value.split(',')]
-            else:
-                values = []
-            if len(values) < num_clients:
-                values.extend([''] * (num_clients - len(values)))
-            elif len(values) > num_clients:
-                values = values[:num_clients]
-            return values
-
-        unique_ids = get_field_values('Unique ID')
-        group_attendance = get_field_values('Group Attendance')
-        diagnosis_codes = get_field_values("Client's Diagnosis Codes")
-
-        # Original Appointment Type
-        original_appointment_type = row.get('Appointment Type', '')
-        normalized_original_appointment_type = ' '.join(original_appointment_type.strip().split())
-
-        # Clean up Appointment Type
-        appointment_type = normalized_original_appointment_type
-        if ' - ' in appointment_type:
-            appointment_type = appointment_type.split(' - ')[0]
-        elif '  ' in appointment_type:
-            appointment_type = appointment_type.split('  ')[0]
-        elif ' ' in appointment_type and appointment_type.split(' ')[-1].endswith('minutes'):
-            appointment_type = ' '.join(appointment_type.split(' ')[:-2])
-
-        # Extract date and time
-        original_date_time = row.get('Date', '')
-        date_only, time_only, date_for_id, time_for_id = '', '', '', ''
-
-        if original_date_time:
-            try:
-                # e.g. "YYYY-MM-DD HH:MM:SS ZZZ"
-                date_time_obj = datetime.strptime(original_date_time, '%Y-%m-%d %H:%M:%S %Z')
-                date_only = date_time_obj.strftime('%Y-%m-%d')
-                time_only = date_time_obj.strftime('%H%M')
-                date_for_id = date_time_obj.strftime('%m%d%y')
-                time_for_id = date_time_obj.strftime('%H%M')
-            except ValueError:
-                # Try removing last 4 characters for timezone
-                try:
-                    date_time_obj = datetime.strptime(original_date_time[:-4], '%Y-%m-%d %H:%M:%S')
-                    date_only = date_time_obj.strftime('%Y-%m-%d')
-                    time_only = date_time_obj.strftime('%H%M')
-                    date_for_id = date_time_obj.strftime('%m%d%y')
-                    time_for_id = date_time_obj.strftime('%H%M')
-                except ValueError:
-                    pass
-
-        # Compute Week and Month
-        week_str, month_str = '', ''
-        if date_only:
-            try:
-                date_obj = datetime.strptime(date_only, '%Y-%m-%d')
-                week_start = date_obj - timedelta(days=date_obj.weekday())
-                week_str = week_start.strftime('%-m/%-d/%Y')
-                month_str = date_obj.strftime('%B %y')
-            except ValueError:
-                pass
-
-        # Abbreviations
-        def abbreviate(text):
-            if not text:
-                return ''
-            words = text.strip().split()
-            abbreviation = ''.join(word[0].upper() for word in words)
-            return abbreviation
-
-        appointment_type_abbr = abbreviate(appointment_type)
-        provider_abbr = abbreviate(row.get('Provider', ''))
-
-        # Process each client
-        for i in range(num_clients):
-            new_row = {}
-            for sh in spreadsheet_headers:
-                if sh in ['Billed', 'Family ID', 'Billing Status']:
-                    new_row[sh] = ''
-                elif sh == 'Date Fixed':
-                    new_row[sh] = date_only
-                elif sh == 'Week':
-                    new_row[sh] = week_str
-                elif sh == 'Month':
-                    new_row[sh] = month_str
-                elif sh == 'Appointment ID':
-                    unique_id = unique_ids[i] if i < len(unique_ids) else ''
-                    appointment_id = f"{date_for_id}-{time_for_id}-{unique_id}-{appointment_type_abbr}-{provider_abbr}"
-                    new_row[sh] = appointment_id
-                elif sh == 'CMS1500':
-                    unique_id = unique_ids[i] if i < len(unique_ids) else ''
-                    cms1500_url = f"https://secure.gethealthie.com/cms1500s/new/?patient_id={unique_id}" if unique_id else ''
-                    new_row[sh] = cms1500_url
-                elif sh == 'CPT Code':
-                    cpt_code = cpt_code_mapping.get(normalized_original_appointment_type, '')
-                    new_row[sh] = cpt_code
-                else:
-                    csv_header = header_mapping.get(sh)
-                    if csv_header:
-                        if csv_header == 'Client Name':
-                            value = client_names[i]
-                        elif csv_header == 'Unique ID':
-                            value = unique_ids[i] if i < len(unique_ids) else ''
-                        elif csv_header == 'Group Attendance':
-                            value = group_attendance[i] if i < len(group_attendance) else ''
-                        else:
-                            value = row.get(csv_header, '')
-                        new_row[sh] = value
-                    else:
-                        new_row[sh] = ''
-
-            # Update Status for group appointments
-            if num_clients > 1:
-                ga = new_row.get('Group Attendance', '').strip().lower()
-                if ga == 'yes':
-                    new_row['Status'] = 'Occurred'
-                elif ga == 'no':
-                    new_row['Status'] = 'Did not attend'
-
-            # Missing Info
-            missing_info = []
-
-            # Attendance check (only for group appointments)
-            if num_clients > 1:
-                if not new_row.get('Group Attendance', '').strip():
-                    missing_info.append('Attendance')
-
-            # Status check
-            status_value = new_row.get('Status', '').strip()
-            if not status_value:
-                missing_info.append('Status')
-
-            # Chart Note Written check
-            chart_note_written = new_row.get('Chart Note Written', '').strip().lower()
-            if chart_note_written == 'no' or not chart_note_written:
-                missing_info.append('Note')
-
-            # Check for missing Diagnosis Codes for CPT 90791 and Status 'Occurred'
-            cpt_code = new_row.get('CPT Code', '')
-            status = new_row.get('Status', '').strip()
-            if cpt_code == '90791' and status == 'Occurred':
-                diagnosis_code = diagnosis_codes[i] if i < len(diagnosis_codes) else ''
-                if not diagnosis_code.strip():
-                    missing_info.append('Diagnosis')
-
-            new_row['Missing Info'] = ', '.join(missing_info) if missing_info else ''
-
-            writer.writerow(new_row)
-
-    return output_buffer.getvalue()
+    # Read CSV from the in-memory file object with pyarrow's multithreaded reader, parsing
+    # only the columns used below. They are typed as non-null strings up front, so nothing
+    # is inferred as numbers, booleans or NA.
+    read_columns = [c for c in source_columns if c not in remove_cols]
+    table = pacsv.read_csv(
+        io.BytesIO(input_csv),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=read_columns,
+            include_missing_columns=True,
+            column_types={c: pa.string() for c in read_columns},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+
+    # Source columns the export doesn't include come back as nulls and behave as empty
+    df = table.to_pandas().fillna('')
+
+    # Everything up to the client split only depends on the appointment, so it is
+    # computed once per input row and carried along to each client by the explode.
+
+    # Original Appointment Type, with runs of whitespace collapsed
+    normalized_appointment_type = df['Appointment Type'].str.split().str.join(' ')
+
+    # Clean up Appointment Type
+    appointment_type = normalized_appointment_type.str.replace(
+        appointment_type_suffix, '', n=1, regex=True
+    )
+
+    # Extract date and time, e.g. "YYYY-MM-DD HH:MM:SS ZZZ". Recurring slots share
+    # timestamps, so each distinct value is parsed and formatted only once.
+    # The date/time prefix is fixed width, so the timezone is simply sliced off.
+    date_codes, date_values = pd.factorize(df['Date'])
+    date_time = pd.to_datetime(
+        pd.Series(date_values, dtype=str).str[:19],
+        format='%Y-%m-%d %H:%M:%S', errors='coerce', cache=True
+    )
+
+    # Compute Week and Month alongside the "date-time-" prefix of the Appointment ID
+    week_start = date_time - pd.to_timedelta(date_time.dt.weekday, unit='D')
+    date_parts = pd.DataFrame({
+        'Date Fixed': date_time.dt.strftime('%Y-%m-%d'),
+        'appointment_id_prefix': date_time.dt.strftime('%m%d%y-%H%M-').fillna('--'),
+        'Week': week_start.dt.strftime('%-m/%-d/%Y'),
+        'Month': date_time.dt.strftime('%B %y'),
+    }).fillna('').take(date_codes).set_axis(df.index)
+    df[date_parts.columns] = date_parts
+
+    # Abbreviations, as the "-type-provider" suffix of the Appointment ID
+    df['appointment_id_suffix'] = '-' + appointment_type.map(abbreviate).str.cat(
+        df['Provider'].map(abbreviate), sep='-'
+    )
+    df['CPT Code'] = normalized_appointment_type.map(cpt_code_mapping).fillna('')
+
+    # Chart Note Written check for Missing Info
+    chart_note_written = df['Chart Note Written'].str.strip().str.lower()
+    df['note_missing'] = (chart_note_written == 'no') | (chart_note_written == '')
+
+    # Split group appointments
+    df['Client Name'] = df['Client Name'].str.split(',')
+    num_clients = df['Client Name'].str.len()
+
+    # Individual sessions, the common case, keep just their first value using the
+    # vectorized string methods. Only group rows are padded one at a time in Python.
+    df['is_group'] = num_clients > 1
+    group_rows = df.index[df['is_group']]
+    per_client_fields = ['Unique ID', 'Group Attendance', "Client's Diagnosis Codes"]
+    for field_name in per_client_fields:
+        values = df[field_name].str.split(',').str[0].str.strip().astype(object)
+        values[group_rows] = pd.Series([
+            split_padded(v, n)
+            for v, n in zip(df.loc[group_rows, field_name], num_clients[group_rows])
+        ], index=group_rows, dtype=object)
+        df[field_name] = values
+
+    # One row per client from here on
+    exploded_fields = ['Client Name'] + per_client_fields
+    df = df.explode(exploded_fields, ignore_index=True)
+    df[exploded_fields] = df[exploded_fields].astype(str)
+    df['Client Name'] = df['Client Name'].str.strip()
+
+    # Per-client fields
+    unique_ids = df['Unique ID']
+    df['Appointment ID'] = df['appointment_id_prefix'].str.cat([unique_ids, df['appointment_id_suffix']])
+    df['CMS1500'] = ('https://secure.gethealthie.com/cms1500s/new/?patient_id=' + unique_ids).where(unique_ids != '', '')
+
+    # Update Status for group appointments. Group fields were already stripped when
+    # they were split, so attendance only needs lowercasing, once for both checks.
+    attendance = df['Group Attendance'].str.lower()
+    df.loc[df['is_group'] & (attendance == 'yes'), 'Status'] = 'Occurred'
+    df.loc[df['is_group'] & (attendance == 'no'), 'Status'] = 'Did not attend'
+
+    # Missing Info
+    status = df['Status'].str.strip()
+    missing_flags = [
+        # Attendance check (only for group appointments)
+        df['is_group'] & (attendance == ''),
+        status == '',
+        df['note_missing'],
+        # Missing Diagnosis Codes for CPT 90791 and Status 'Occurred'
+        (df['CPT Code'] == '90791') & (status == 'Occurred')
+        & (df["Client's Diagnosis Codes"] == ''),
+    ]
+    missing_code = sum(flag * (1 << bit) for bit, flag in enumerate(missing_flags))
+    df['Missing Info'] = pd.Series(missing_info_labels).take(missing_code).to_numpy()
+
+    # Write the transformed CSV as plain lists in spreadsheet_headers order, straight from
+    # the source columns, encoding into a bytes buffer the download button can serve as is
+    raw_buffer = io.BytesIO()
+    output_buffer = io.TextIOWrapper(raw_buffer, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(output_buffer)
+    writer.writerow(spreadsheet_headers)
+    blank = [''] * len(df)
+    columns = [df[source].tolist() if source else blank for source in header_sources.values()]
+    writer.writerows(zip(*columns))
+    output_buffer.flush()
+
+    return raw_buffer.getvalue()
 
 # ---------------------------
 # Streamlit App
@@ -271,14 +283,14 @@ def main_app():
     if uploaded_file is not None:
         # Process the CSV
         # remove_cols = [col.strip() for col in remove_cols_input.split(',')] if remove_cols_input else None
-        output_csv_str = process_csv(uploaded_file.read())  # Pass the file content to the process function
+        output_csv_bytes = process_csv(uploaded_file.getvalue())  # Same bytes on every rerun, so the cached result is reused
 
         st.success("Transformation complete! You can now download the transformed CSV below.")
 
         # Download button
         st.download_button(
             label="Download Transformed CSV",
-            data=output_csv_str,
+            data=output_csv_bytes,
             file_name="transformed_output.csv",
             mime="text/csv"
         )